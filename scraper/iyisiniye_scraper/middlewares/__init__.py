@@ -5,6 +5,7 @@ Scrapy settings.py'de tanimlanan downloader middleware'leri:
     - RotatingUserAgentMiddleware (400): Her istekte farkli User-Agent kullanir
     - SkyStoneProxyDownloaderMiddleware (410): SkyStone Proxy API ile proxy rotasyonu
     - AdaptiveRateLimiter (420): Platform bazli adaptif rate limiting
+    - GridHizMiddleware (450): Maps grid isteklerini navigasyondan once hiz kovasiyla sinirlar
 
 Proxy middleware'in ana implementasyonu
 scraper/middlewares/proxy_middleware.py dosyasindadir.
@@ -120,3 +121,22 @@ class SkyStoneProxyDownloaderMiddleware:
     def get_proxy_stats(self) -> dict[str, Any]:
         """Proxy istatistiklerini dondurur."""
         return self._proxy.get_stats()
+
+
+class GridHizMiddleware:
+    """
+    Grid isteklerini tarayici navigasyonundan once hiz butcesiyle sinirlar.
+
+    scrapy-playwright sayfayi download handler'da actigi icin spider
+    callback'inde alinan token Google'a giden istegi degil, yalnizca
+    sonraki islemleri geciktirir. Bu middleware token'i handler'dan once
+    alir; bekleyen istek tarayici sayfasi acmaz.
+
+    Spider `grid_hiz_tokeni_al()` coroutine'ini saglamalidir; grid meta
+    bilgisi (`_gm`) tasimayan istekler beklemeden gecer.
+    """
+
+    async def process_request(self, request: Request, spider: Spider) -> None:
+        """Grid istegi icin ortak hiz kovasindan token alir."""
+        if "_gm" in request.meta:
+            await spider.grid_hiz_tokeni_al()
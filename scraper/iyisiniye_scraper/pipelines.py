@@ -16,6 +16,7 @@ import unicodedata
 from datetime import datetime, timezone
 from typing import Any
 
+import orjson
 from itemadapter import ItemAdapter
 from loguru import logger
 from scrapy import Spider
@@ -612,8 +613,8 @@ class DatabasePipeline:
         # raw_data JSON donusumu
         raw_data = veri.get("raw_data")
         if raw_data and not isinstance(raw_data, str):
-            import json
-            raw_data = json.dumps(raw_data, ensure_ascii=False)
+            # Her kayitta calisir: orjson standart json modulunden daha hizlidir
+            raw_data = orjson.dumps(raw_data, option=orjson.OPT_NON_STR_KEYS).decode()
 
         platform_sql = """
             INSERT INTO restaurant_platforms (
@@ -0,0 +1,944 @@
+"""
+Google Maps Listeleme Spider'i Yardimci Fonksiyon Testleri
+
+Test Senaryolari:
+1. Adres metninden ilce tespiti (Turkce karakterli ve ASCII)
+2. Altigen grid noktasi, alt-grid ve arama URL'i uretimi; doygun kova atlama
+3. Tam sayi grid key'i (paketleme / cozme) ve delta checkpoint kaydi
+4. Proxy rate limit takibi ve secimi (kayan pencere + bekleme heap'i)
+5. Proxy havuzunun tier'lardan doldurulmasi
+6. Proxy bazli Playwright context havuzu ve kaynak engelleme
+7. Ham kart alanlarindan restoran verisi cikarma ve sayi parse
+8. CAPTCHA ve liste sonu isaretleri
+9. Grid hiz sinirlayici (token kovasi) ve ardisik hata duraklamasi
+"""
+
+import asyncio
+import json
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+import scrapy
+from loguru import logger
+
+from iyisiniye_scraper.middlewares import GridHizMiddleware
+from iyisiniye_scraper.spiders import google_maps_list
+from iyisiniye_scraper.spiders.google_maps_list import (
+    _CAPTCHA_RE,
+    _LISTE_SONU_RE,
+    GoogleMapsListSpider,
+    _GridMeta,
+    _ilce_belirle_koordinat,
+    _ilce_belirle_metin,
+    _kaynak_engellensin_mi,
+    _TokenKovasi,
+)
+
+
+@pytest.fixture
+def spider():
+    """Proxy API ve DB'ye baglanmadan olusturulan spider ornegi."""
+    spider = GoogleMapsListSpider.__new__(GoogleMapsListSpider)
+    spider.grid_size = GoogleMapsListSpider.DEFAULT_GRID_SIZE
+    spider.zoom = GoogleMapsListSpider.DEFAULT_ZOOM
+    spider.spider_logger = logger
+    return spider
+
+
+class TestIlceBelirleMetin:
+    """Adres metninden ilce tespiti testleri."""
+
+    def test_turkce_karakterli_ilce(self):
+        """Turkce karakterli ilce adi normalize edilmis hale donusur."""
+        assert _ilce_belirle_metin("Caferağa, Moda Cd. No:5, 34710 Kadıköy/İstanbul") == "kadikoy"
+
+    def test_ascii_ilce(self):
+        """ASCII yazilmis ilce adi da taninir."""
+        assert _ilce_belirle_metin("Bagdat Cd. No:12 Maltepe") == "maltepe"
+
+    def test_buyuk_harf(self):
+        """Buyuk harfli adreslerde de ilce bulunur."""
+        assert _ilce_belirle_metin("FATIH") == "fatih"
+
+    def test_metinde_ilk_gecen_ilce(self):
+        """Birden fazla ilce geciyorsa metinde ilk gecen dondurulur."""
+        assert _ilce_belirle_metin("Beşiktaş Cd. No:3, Şişli") == "besiktas"
+
+    def test_ilce_yoksa_bos(self):
+        """Ilce adi gecmeyen adres bos string dondurur."""
+        assert _ilce_belirle_metin("Ankara Cd. No:1") == ""
+        assert _ilce_belirle_metin("") == ""
+
+
+class TestIlceBelirleKoordinat:
+    """Koordinattan ilce tespiti testleri."""
+
+    def test_yakin_koordinatlar_onbellekten_doner(self):
+        """Ayni ~100 m hucresindeki koordinatlar tek hesaplamayla cozulur."""
+        google_maps_list._ilce_belirle_hucre.cache_clear()
+        ilce = _ilce_belirle_koordinat(41.04312, 29.00621)
+        assert ilce == "besiktas"
+        assert _ilce_belirle_koordinat(41.04291, 29.00648) == ilce
+        bilgi = google_maps_list._ilce_belirle_hucre.cache_info()
+        assert (bilgi.hits, bilgi.misses) == (1, 1)
+
+
+class TestGridNoktalari:
+    """Altigen grid noktasi uretimi testleri."""
+
+    def test_kare_izgaradan_az_nokta(self, spider):
+        """Altigen dizilim esdeger kare izgaradan daha az nokta uretir."""
+        noktalar = spider._grid_noktalari_hesapla()
+        assert 0 < len(noktalar) < spider.grid_size ** 2
+        assert len(set(noktalar)) == len(noktalar)
+
+    def test_bounding_box_kapsaniyor(self, spider):
+        """Noktalar Istanbul bounding box'inin dort kenarina ulasir."""
+        noktalar = spider._grid_noktalari_hesapla()
+        latlar = [lat for lat, _ in noktalar]
+        lnglar = [lng for _, lng in noktalar]
+        assert min(latlar) == spider.ISTANBUL_SW_LAT
+        assert min(lnglar) == spider.ISTANBUL_SW_LNG
+        assert max(latlar) >= spider.ISTANBUL_NE_LAT
+        assert max(lnglar) >= spider.ISTANBUL_NE_LNG
+
+    def test_tek_nokta(self, spider):
+        """grid_size=1 icin tek nokta uretilir."""
+        spider.grid_size = 1
+        assert spider._grid_noktalari_hesapla() == [
+            (spider.ISTANBUL_SW_LAT, spider.ISTANBUL_SW_LNG)
+        ]
+
+    def test_alt_grid_noktalari(self, spider):
+        """Alt-grid 2x2 koseleri overlap'li adimla ve bir ust zoom ile uretilir."""
+        spider.ALT_GRID_OVERLAP = 0.0
+        alt = spider._alt_grid_noktalari_hesapla(41.0, 29.0, 15)
+        assert alt == [
+            (40.9865, 28.9825, 16),
+            (40.9865, 29.0175, 16),
+            (41.0135, 28.9825, 16),
+            (41.0135, 29.0175, 16),
+        ]
+
+    def test_ayni_hucre_tekrar_planlanmaz(self, spider):
+        """Ayni zoom'da ~10m icindeki alt-grid ikinci kez planlanmaz."""
+        spider._planlanan_alt_hucreler = set()
+        assert spider._alt_grid_planla(41.01351, 29.01749, 16)
+        assert not spider._alt_grid_planla(41.01349, 29.01751, 16)
+        assert spider._alt_grid_planla(41.01349, 29.01751, 17)
+        assert spider._alt_grid_planla(41.0140, 29.0175, 16)
+
+    def test_arama_url(self):
+        """Arama URL'i merkez koordinatlari ve zoom ile olusturulur."""
+        assert GoogleMapsListSpider._arama_url(41.0, 29.012345, 16) == (
+            "https://www.google.com/maps/search/restoran/@41.0,29.012345,16z?hl=tr"
+        )
+
+
+class TestGridKey:
+    """Tam sayi grid key'i testleri."""
+
+    def test_key_geri_cozulur(self):
+        """Paketlenen key ayni koordinatlara geri cozulur."""
+        key = GoogleMapsListSpider._grid_key(41.012345, 28.987654)
+        assert isinstance(key, int)
+        assert GoogleMapsListSpider._grid_key_coz(key) == (41.012345, 28.987654)
+
+    def test_negatif_boylam(self):
+        """Negatif boylamlar da dogru paketlenir."""
+        key = GoogleMapsListSpider._grid_key(-33.5, -70.654321)
+        assert GoogleMapsListSpider._grid_key_coz(key) == (-33.5, -70.654321)
+
+    def test_farkli_noktalar_farkli_key(self, spider):
+        """Tum grid noktalari birbirinden farkli key uretir."""
+        noktalar = spider._grid_noktalari_hesapla()
+        keyler = {spider._grid_key(lat, lng) for lat, lng in noktalar}
+        assert len(keyler) == len(noktalar)
+
+    def test_eski_checkpoint_formati(self, spider, tmp_path):
+        """Metin key'li eski checkpoint dosyasi tam sayi key'lere cevrilir."""
+        dosya = tmp_path / "checkpoint.json"
+        dosya.write_text(json.dumps({"gridler": ["41.000000,29.000000"], "restoranlar": []}))
+        spider.CHECKPOINT_DOSYA = str(dosya)
+        spider.gorulmus_restoranlar = set()
+        spider._checkpoint_yukle()
+        assert spider._tamamlanan_gridler == {spider._grid_key(41.0, 29.0)}
+
+
+class TestDoygunlukFiltresi:
+    """Doygun bolge kovasindaki ana gridlerin atlanmasi testleri."""
+
+    @pytest.fixture
+    def doygun_spider(self, spider):
+        spider.scrape_stats = defaultdict(int)
+        spider._kova_boyu = (0.1, 0.1)
+        spider._kova_durumlari = defaultdict(google_maps_list._KovaDurumu)
+        spider._calisma_restoranlari = set()
+        spider._ertelenen_gridler = set()
+        spider._tamamlanan_gridler = set()
+        spider._tamamlanan_ana_gridler = 0
+        spider._bekleyen_alt_gridler = 0
+        spider._dogrulama_gecisi_aktif = False
+        spider._ana_tarama_tamamlandi = False
+        spider._dogrulama_gecisi_baslat = MagicMock()
+        spider._proxy_ile_request_olustur = lambda url, gm: (url, gm)
+        spider.grid_noktalari = [(41.01, 29.01), (41.02, 29.02)]
+        spider.grid_keyleri = [spider._grid_key(*n) for n in spider.grid_noktalari]
+        spider.grid_urlleri = ["url0", "url1"]
+        return spider
+
+    def test_az_yeni_getiren_kova_doygun_sayilir(self, doygun_spider):
+        """En az 3 grid %5'ten az yeni getirdiyse kova doygundur."""
+        for _ in range(2):
+            doygun_spider._kova_sonucu_kaydet(41.03, 29.03, yeni=1, kart=40)
+        assert not doygun_spider._grid_doygun_mu(41.05, 29.05)
+        doygun_spider._kova_sonucu_kaydet(41.03, 29.03, yeni=1, kart=40)
+        assert doygun_spider._grid_doygun_mu(41.05, 29.05)
+        # Komsu kova etkilenmez
+        assert not doygun_spider._grid_doygun_mu(41.15, 29.05)
+
+    def test_kart_limitine_ulasan_kova_atlanmaz(self, doygun_spider):
+        """Yogun (alt-grid gerektiren) bolgelerde nokta atlanmaz."""
+        for kart in (40, 40, doygun_spider.CARD_LIMIT_THRESHOLD):
+            doygun_spider._kova_sonucu_kaydet(41.03, 29.03, yeni=0, kart=kart)
+        assert not doygun_spider._grid_doygun_mu(41.05, 29.05)
+
+    def test_onceden_yuklenmis_restoranlar_doygunluk_sayilmaz(self, doygun_spider):
+        """Checkpoint / DB'den gelen restoranlar bu calismada yeni sayilir."""
+        doygun_spider.scrape_stats = defaultdict(int)
+        doygun_spider._checkpoint_yeni_restoranlar = []
+        kartlar = [
+            {"href": f"https://www.google.com/maps/place/X/data=!1s0x{i}:0x{i}"}
+            for i in range(20)
+        ]
+        doygun_spider._kaynak_id_belirle = lambda href: href.rsplit("!1s", 1)[1]
+        doygun_spider.gorulmus_restoranlar = {k["href"].rsplit("!1s", 1)[1] for k in kartlar}
+        page = MagicMock(evaluate=AsyncMock(return_value={"selektor": "a", "kartlar": kartlar}))
+        for _ in range(3):
+            _, yeni, kart, calisma_yeni = asyncio.run(
+                doygun_spider._restoran_verilerini_cikar(page, None)
+            )
+            assert yeni == 0
+            doygun_spider._kova_sonucu_kaydet(41.03, 29.03, calisma_yeni, kart)
+        # Ilk grid 20/20 yeni getirdi; oran %33 > %5, kova doygun degil
+        assert not doygun_spider._grid_doygun_mu(41.05, 29.05)
+
+    def test_ertelenen_nokta_dogrulamada_bolunur(self, doygun_spider):
+        """Dogrulamada yalnizca ertelenmis noktalar alt-grid'e bolunur."""
+        doygun_spider._ertelenen_gridler = {1}
+        doygun_spider._dogrulama_gecisi_aktif = True
+        limit = doygun_spider.CARD_LIMIT_THRESHOLD
+        ertelenen = _GridMeta(1, 41.02, 29.02, doygun_spider.zoom)
+        taranmis = _GridMeta(0, 41.01, 29.01, doygun_spider.zoom)
+        alt_grid = _GridMeta(1, 41.02, 29.02, doygun_spider.zoom + 1, derinlik=1)
+        assert doygun_spider._alt_grid_bolunsun_mu(ertelenen, limit)
+        assert doygun_spider._alt_grid_bolunsun_mu(alt_grid, limit)
+        assert not doygun_spider._alt_grid_bolunsun_mu(taranmis, limit)
+        assert not doygun_spider._alt_grid_bolunsun_mu(ertelenen, limit - 1)
+
+    def test_son_nokta_atlaninca_dogrulama_baslar(self, doygun_spider):
+        """Doygun nokta checkpoint'e yazilmaz, dogrulama gecisi yine de tetiklenir."""
+        for _ in range(3):
+            doygun_spider._kova_sonucu_kaydet(41.03, 29.03, yeni=0, kart=20)
+        istekler = list(doygun_spider.start_requests())
+        assert doygun_spider.scrape_stats["doygun_grid_atlandi"] == 2
+        assert doygun_spider._ertelenen_gridler == {0, 1}
+        assert doygun_spider._tamamlanan_gridler == set()
+        assert doygun_spider._dogrulama_gecisi_baslat.call_count == 1
+        assert [url for url, _ in istekler] == ["url0", "url1"]
+
+
+class TestCheckpointKaydet:
+    """Arka plan checkpoint yazimi testleri."""
+
+    @pytest.fixture
+    def ck_spider(self, spider, tmp_path):
+        spider.CHECKPOINT_DOSYA = str(tmp_path / "checkpoint.json")
+        spider.CHECKPOINT_KAYIT_ARALIGI_SN = 0.05
+        spider.gorulmus_restoranlar = {"r1"}
+        spider._tamamlanan_gridler = {spider._grid_key(41.0, 29.0)}
+        spider._checkpoint_yazici = ThreadPoolExecutor(max_workers=1)
+        spider._checkpoint_gorev = None
+        spider._checkpoint_kirli = False
+        spider._son_checkpoint_zamani = 0.0
+        spider._checkpoint_zamanlayici = None
+        spider._checkpoint_yeni_gridler = []
+        spider._checkpoint_yeni_restoranlar = []
+        spider._checkpoint_delta_sayisi = 0
+        yield spider
+        spider._checkpoint_yazici.shutdown(wait=True)
+
+    def _restoran_ekle(self, spider, source_id):
+        spider.gorulmus_restoranlar.add(source_id)
+        spider._checkpoint_yeni_restoranlar.append(source_id)
+
+    def test_aralik_icindeki_kayitlar_birlestirilir(self, ck_spider, tmp_path):
+        """Aralik icindeki kayit istekleri tek gecikmeli delta yaziminda birlesir."""
+        yazilanlar = []
+        ck_spider._checkpoint_delta_ekle = lambda veri: yazilanlar.append(veri)
+
+        async def senaryo():
+            self._restoran_ekle(ck_spider, "r2")
+            ck_spider._checkpoint_kaydet()  # Ilk istek hemen yazilir
+            ck_spider._checkpoint_gorev.result()
+            for i in range(5):
+                self._restoran_ekle(ck_spider, f"r{i + 3}")
+                ck_spider._checkpoint_kaydet()
+            assert len(yazilanlar) == 1
+            await asyncio.sleep(0.6)
+            ck_spider._checkpoint_gorev.result()
+
+        asyncio.run(senaryo())
+        assert len(yazilanlar) == 2
+        # Delta yalnizca son yazimdan beri eklenenleri tasir
+        assert yazilanlar[1] == {"gridler": [], "restoranlar": ["r3", "r4", "r5", "r6", "r7"]}
+        assert ck_spider._checkpoint_zamanlayici is None
+
+    def test_delta_snapshot_uzerine_uygulanir(self, ck_spider, tmp_path):
+        """Yeniden baslatmada snapshot'a delta satirlari eklenir, yarim satir atlanir."""
+        ck_spider._checkpoint_kaydet(zorla=True)
+        ck_spider._checkpoint_gorev.result()
+        yeni_grid = ck_spider._grid_key(41.01, 29.01)
+        ck_spider._tamamlanan_gridler.add(yeni_grid)
+        ck_spider._checkpoint_yeni_gridler.append(yeni_grid)
+        self._restoran_ekle(ck_spider, "r2")
+        ck_spider._checkpoint_yazimi_baslat()
+        ck_spider._checkpoint_gorev.result()
+        with open(ck_spider._checkpoint_delta_dosya, "ab") as f:
+            f.write(b'{"gridler": [1')  # Yazim sirasinda kesilmis satir
+
+        ck_spider.gorulmus_restoranlar = set()
+        ck_spider._checkpoint_yukle()
+        assert ck_spider._tamamlanan_gridler == {ck_spider._grid_key(41.0, 29.0), yeni_grid}
+        assert ck_spider.gorulmus_restoranlar == {"r1", "r2"}
+
+    def test_bozuk_delta_sonrasi_yeni_delta_korunur(self, ck_spider, tmp_path):
+        """Yarim satir yuklemede sikistirilir; sonraki delta ikinci yuklemede kaybolmaz."""
+        ck_spider._checkpoint_kaydet(zorla=True)
+        ck_spider._checkpoint_gorev.result()
+        with open(ck_spider._checkpoint_delta_dosya, "ab") as f:
+            f.write(b'{"gridler": [1')  # Cokme sirasinda kesilmis satir
+
+        ck_spider.gorulmus_restoranlar = set()
+        ck_spider._checkpoint_yukle()
+        assert [p.name for p in tmp_path.iterdir()] == ["checkpoint.json"]
+
+        self._restoran_ekle(ck_spider, "r2")
+        ck_spider._checkpoint_yazimi_baslat()
+        ck_spider._checkpoint_gorev.result()
+
+        ck_spider.gorulmus_restoranlar = set()
+        ck_spider._checkpoint_yukle()
+        assert ck_spider.gorulmus_restoranlar == {"r1", "r2"}
+
+    def test_sikistirma_delta_dosyasini_siler(self, ck_spider, tmp_path):
+        """Sikistirma araligina ulasinca tam snapshot yazilir ve delta silinir."""
+        ck_spider.CHECKPOINT_SIKISTIRMA_ARALIGI = 2
+        for i in range(3):
+            self._restoran_ekle(ck_spider, f"r{i + 2}")
+            ck_spider._checkpoint_yazimi_baslat()
+            ck_spider._checkpoint_gorev.result()
+        assert [p.name for p in tmp_path.iterdir()] == ["checkpoint.json"]
+        ck_spider.gorulmus_restoranlar = set()
+        ck_spider._checkpoint_yukle()
+        assert ck_spider.gorulmus_restoranlar == {"r1", "r2", "r3", "r4"}
+
+    def test_zorla_kayit_geri_yuklenir(self, ck_spider, tmp_path):
+        """Zorla kayit hemen yazilir, gecici dosya kalmaz ve geri yuklenebilir."""
+        ck_spider._checkpoint_kaydet(zorla=True)
+        ck_spider._checkpoint_gorev.result()
+        assert [p.name for p in tmp_path.iterdir()] == ["checkpoint.json"]
+        beklenen = ck_spider._tamamlanan_gridler
+        ck_spider.gorulmus_restoranlar = set()
+        ck_spider._checkpoint_yukle()
+        assert ck_spider._tamamlanan_gridler == beklenen
+        assert ck_spider.gorulmus_restoranlar == {"r1"}
+
+
+class TestProxyRateLimit:
+    """Proxy rate limit takibi testleri."""
+
+    @pytest.fixture
+    def saat(self, monkeypatch):
+        """Spider modulundeki zamani elle ilerletilebilir hale getirir."""
+        simdi = [1000.0]
+        monkeypatch.setattr(google_maps_list._time, "time", lambda: simdi[0])
+        return simdi
+
+    @pytest.fixture
+    def rl_spider(self, spider):
+        spider._proxy_kullanim = defaultdict(deque)
+        spider._rate_limitli = set()
+        spider._rate_limit_heap = []
+        return spider
+
+    def test_limit_dolunca_rate_limitli(self, rl_spider, saat):
+        """PROXY_RATE_LIMIT kullanimdan sonra proxy rate limitli olur."""
+        for _ in range(rl_spider.PROXY_RATE_LIMIT):
+            assert "p1" not in rl_spider._rate_limitli
+            rl_spider._proxy_kullanim_kaydet("p1")
+        assert "p1" in rl_spider._rate_limitli
+        assert not rl_spider._rate_limit_uygun("p1")
+
+    def test_pencere_dolunca_serbest(self, rl_spider, saat):
+        """Pencere suresi dolunca proxy tekrar uygun hale gelir."""
+        for _ in range(rl_spider.PROXY_RATE_LIMIT):
+            rl_spider._proxy_kullanim_kaydet("p1")
+        saat[0] += rl_spider.PROXY_RATE_WINDOW - 1
+        rl_spider._rate_limit_serbest_birak()
+        assert "p1" in rl_spider._rate_limitli
+        saat[0] += 1
+        rl_spider._rate_limit_serbest_birak()
+        assert "p1" not in rl_spider._rate_limitli
+        assert rl_spider._rate_limit_uygun("p1")
+
+    def test_eszamanli_istek_sayisi(self, rl_spider):
+        """Es zamanlilik proxy rate butcesine gore belirlenir ve sinirlanir."""
+        rl_spider.proxy_pool = ["p1"]
+        assert rl_spider._eszamanli_istek_sayisi() == 3
+        rl_spider.proxy_pool = [f"p{i}" for i in range(5)]
+        assert rl_spider._eszamanli_istek_sayisi() == 5 * rl_spider.PROXY_RATE_LIMIT
+        rl_spider.proxy_pool = [f"p{i}" for i in range(500)]
+        assert rl_spider._eszamanli_istek_sayisi() == rl_spider.MAX_ESZAMANLI_ISTEK
+
+    def test_proxy_sec_haric_tutulanlari_atlar(self, rl_spider, saat):
+        """Secim basarisiz ve rate limitli proxy'leri atlar, basarili olani tercih eder."""
+        havuz = [f"p{i}" for i in range(20)]
+        rl_spider.proxy_pool = list(havuz)
+        rl_spider._proxy_havuz_kumesi = set(havuz)
+        rl_spider._basarili_proxyler = {"p0", "p1"}
+        rl_spider._son_proxy_yenileme = saat[0]
+        rl_spider.PROXY_YENILEME_PERIYODU = 1800
+        rl_spider._rate_limitli.add("p1")
+        assert rl_spider._proxy_sec() == "p0"
+        for _ in range(10):
+            secilen = rl_spider._proxy_sec(hariç_tutulanlar={"p0", "p2", "p3"})
+            assert secilen not in {"p0", "p1", "p2", "p3"}
+
+
+class TestProxyHavuzu:
+    """Proxy havuzu doldurma testleri."""
+
+    @staticmethod
+    def _sahte_get(url, **kwargs):
+        tier = url.rsplit("/", 1)[-1]
+        if tier == "medium":
+            raise ConnectionError("tier erisilemedi")
+        resp = MagicMock()
+        resp.json.return_value = {
+            "success": True,
+            "proxies": [
+                {"protocol": "HTTP", "ip": f"10.0.0.{1 if tier == 'high' else 2}", "port": 80},
+                {"protocol": "socks5", "ip": "10.0.0.9", "port": 1080},
+            ],
+        }
+        return resp
+
+    def test_basarili_tierler_birlestirilir(self, spider, monkeypatch):
+        """Hatali tier atlanir, digerlerinin HTTP proxy'leri havuza eklenir."""
+        monkeypatch.setattr(google_maps_list.http_requests, "get", self._sahte_get)
+        spider.proxy_pool = []
+        spider._proxy_havuz_kumesi = set()
+        spider._proxy_havuzu_doldur()
+        assert sorted(spider.proxy_pool) == ["http://10.0.0.1:80", "http://10.0.0.2:80"]
+
+    def test_yenilemede_tekrar_eklenmez(self, spider, monkeypatch):
+        """Havuz yenilendiginde zaten bulunan proxy'ler tekrar eklenmez."""
+        monkeypatch.setattr(google_maps_list.http_requests, "get", self._sahte_get)
+        spider.proxy_pool = []
+        spider._proxy_havuz_kumesi = set()
+        spider._proxy_havuzu_doldur()
+        spider._proxy_havuzu_doldur()
+        assert len(spider.proxy_pool) == 2
+
+    def test_bos_havuz_hata(self, spider, monkeypatch):
+        """Hic proxy alinamazsa RuntimeError firlatilir."""
+        def hata(*args, **kwargs):
+            raise ConnectionError("api kapali")
+
+        monkeypatch.setattr(google_maps_list.http_requests, "get", hata)
+        spider.proxy_pool = []
+        spider._proxy_havuz_kumesi = set()
+        with pytest.raises(RuntimeError):
+            spider._proxy_havuzu_doldur()
+
+
+class TestProxyContext:
+    """Proxy bazli context havuzu testleri."""
+
+    @pytest.fixture
+    def ctx_spider(self, spider):
+        spider._context_sayaci = 0
+        spider._proxy_contextleri = OrderedDict()
+        spider._context_nesneleri = {}
+        spider._kapanan_contextler = set()
+        spider.MAX_ACIK_CONTEXT = 2
+        return spider
+
+    def test_ayni_proxy_ayni_context(self, ctx_spider):
+        """Ayni proxy tekrar secildiginde mevcut context adi kullanilir."""
+        ilk = ctx_spider._proxy_context_adi("p1")
+        assert ctx_spider._proxy_context_adi("p2") != ilk
+        assert ctx_spider._proxy_context_adi("p1") == ilk
+
+    def test_en_eski_context_birakilir(self, ctx_spider):
+        """Limit asilinca en uzun suredir kullanilmayan proxy'nin context'i birakilir."""
+        ctx_spider._proxy_context_adi("p1")
+        ctx_spider._proxy_context_adi("p2")
+        ctx_spider._proxy_context_adi("p1")
+        ctx_spider._proxy_context_adi("p3")
+        assert list(ctx_spider._proxy_contextleri) == ["p1", "p3"]
+
+    def test_bosalan_context_kapatilir(self, ctx_spider):
+        """Birakilan context son sayfasi kapandiktan sonra kapatilir."""
+        context_adi = ctx_spider._proxy_context_adi("p1")
+        context = MagicMock(pages=[object()], close=AsyncMock())
+        ctx_spider._context_nesneleri[context_adi] = context
+
+        ctx_spider._proxy_context_birak("p1")
+        context.close.assert_not_called()
+
+        context.pages = []
+        asyncio.run(ctx_spider._context_temizle(context_adi))
+        context.close.assert_awaited_once()
+        assert context_adi not in ctx_spider._context_nesneleri
+
+    def test_bos_context_kapanana_kadar_referansi_tutulur(self, ctx_spider):
+        """Hemen kapatilan context'in gorevi bitene kadar sette saklanir."""
+        context_adi = ctx_spider._proxy_context_adi("p1")
+        context = MagicMock(pages=[], close=AsyncMock())
+        ctx_spider._context_nesneleri[context_adi] = context
+
+        async def birak():
+            ctx_spider._proxy_context_birak("p1")
+            assert len(ctx_spider._kapanan_contextler) == 1
+            await asyncio.gather(*ctx_spider._kapanan_contextler)
+
+        asyncio.run(birak())
+        context.close.assert_awaited_once()
+        assert not ctx_spider._kapanan_contextler
+
+    def test_kullanimdaki_context_kapatilmaz(self, ctx_spider):
+        """Hala bir proxy'ye bagli context sayfa kapaninca acik kalir."""
+        context_adi = ctx_spider._proxy_context_adi("p1")
+        context = MagicMock(pages=[], close=AsyncMock())
+        ctx_spider._context_nesneleri[context_adi] = context
+        asyncio.run(ctx_spider._context_temizle(context_adi))
+        context.close.assert_not_called()
+
+    def test_hata_sonrasi_tekrar_alt_grid_bilgisini_korur(self, ctx_spider, monkeypatch):
+        """Proxy hatasindan sonraki tekrar istegi alt-grid meta'sini ve onceligini tasir."""
+        ctx_spider.scrape_stats = defaultdict(int)
+        monkeypatch.setattr(ctx_spider, "_proxy_sec", lambda hariç_tutulanlar=None: "p2")
+        gm = _GridMeta(3, 41.0, 29.0, 16, derinlik=1, parent_grid_key=123, proxy_url="p1")
+        failure = MagicMock(type=TimeoutError)
+        failure.request.url = "https://www.google.com/maps/search/restoran/@41.0,29.0,16z"
+        failure.request.meta = {"_gm": gm}
+
+        async def topla():
+            return [istek async for istek in ctx_spider.hata_yakala(failure)]
+
+        (istek,) = asyncio.run(topla())
+        yeni = istek.meta["_gm"]
+        assert (yeni.derinlik, yeni.zoom, yeni.parent_grid_key, yeni.retry) == (1, 16, 123, 1)
+        assert yeni.basarisiz_proxyler == {"p1"}
+        assert yeni.proxy_url == "p2"
+        assert gm.retry == 0
+
+    def test_stealth_betigi_context_basina_bir_kez_eklenir(self):
+        """Ayni context'in ikinci sayfasinda betik tekrar gonderilmez."""
+        context = MagicMock(add_init_script=AsyncMock())
+        for _ in range(3):
+            asyncio.run(google_maps_list.stealth_init_callback(MagicMock(context=context)))
+        context.add_init_script.assert_awaited_once_with(google_maps_list._STEALTH_JS)
+
+
+class TestKaynakEngelleme:
+    """Playwright kaynak engelleme predicate'i testleri."""
+
+    MAPS_URL = "https://www.google.com/maps/search/restoran/@41.0,29.0,15z"
+
+    @pytest.mark.parametrize("tip", ["image", "font", "media"])
+    def test_agir_kaynaklar_engellenir(self, tip):
+        """Gorsel, font ve medya istekleri iptal edilir."""
+        assert _kaynak_engellensin_mi(MagicMock(resource_type=tip, url=self.MAPS_URL))
+
+    @pytest.mark.parametrize("tip", ["document", "script", "xhr", "fetch", "stylesheet"])
+    def test_gerekli_kaynaklar_gecer(self, tip):
+        """Sayfa ve sonuc listesi icin gereken istekler engellenmez."""
+        assert not _kaynak_engellensin_mi(MagicMock(resource_type=tip, url=self.MAPS_URL))
+
+    @pytest.mark.parametrize("url", [
+        "https://www.google-analytics.com/g/collect?v=2",
+        "https://www.googletagmanager.com/gtag/js?id=G-1",
+        "https://googleads.g.doubleclick.net/pagead/id",
+        "https://www.google.com/gen_204?atyp=csi",
+    ])
+    def test_analitik_istekleri_engellenir(self, url):
+        """Analitik / reklam beacon'lari kaynak tipinden bagimsiz iptal edilir."""
+        assert _kaynak_engellensin_mi(MagicMock(resource_type="script", url=url))
+
+
+class TestTekKartIsle:
+    """Ham kart alanlarindan restoran verisi cikarma testleri."""
+
+    HREF = (
+        "https://www.google.com/maps/place/Ciya+Sofrasi/data=!4m7!3m6"
+        "!1s0x14cab8679fe2f5c5:0x1d6e3d1f8d9b5e2a!8m2!3d40.9903!4d29.0276"
+    )
+
+    def _kart(self, **alanlar):
+        kart = {
+            "href": self.HREF,
+            "aria_label": "Çiya Sofrası",
+            "kart_metni": (
+                "Çiya Sofrası\n4,6(12.345)\nTürk Restoranı · ₺₺\nGüneşlibahçe Sk. No:43, Kadıköy"
+            ),
+            "ad": None,
+            "puan": None,
+            "yorum": None,
+            "kategori": None,
+            "adres": None,
+            "gorsel": None,
+        }
+        kart.update(alanlar)
+        return kart
+
+    def test_alt_elementlerden_cikarma(self, spider):
+        """Alt element metinleri varsa dogrudan kullanilir."""
+        veri = spider._tek_kart_isle(self._kart(
+            ad="Çiya Sofrası", puan="4,6", yorum="(12.345)",
+            kategori="Türk Restoranı · ₺₺", adres="· Güneşlibahçe Sk. No:43",
+            gorsel="https://lh5.googleusercontent.com/p/abc",
+        ))
+        assert veri["source_id"] == "0x14cab8679fe2f5c5:0x1d6e3d1f8d9b5e2a"
+        assert (veri["latitude"], veri["longitude"]) == (40.9903, 29.0276)
+        assert veri["name"] == "Çiya Sofrası"
+        assert veri["rating"] == 4.6
+        assert veri["total_reviews"] == 12345
+        assert veri["cuisine_types"] == ["Türk Restoranı"]
+        assert veri["price_range"] == 2
+        assert veri["address"] == "Güneşlibahçe Sk. No:43"
+        assert veri["image_url"] == "https://lh5.googleusercontent.com/p/abc"
+
+    def test_kart_metninden_fallback(self, spider):
+        """Alt elementler yoksa ad aria-label'dan, digerleri kart metninden bulunur."""
+        veri = spider._tek_kart_isle(self._kart(gorsel="data:image/png;base64,xx"))
+        assert veri["name"] == "Çiya Sofrası"
+        assert veri["rating"] == 4.6
+        assert veri["total_reviews"] == 12345
+        assert veri["cuisine_types"] == ["Türk Restoranı"]
+        assert veri["image_url"] is None
+
+    def test_gorulmus_kart_islenmeden_atlanir(self, spider, monkeypatch):
+        """Daha once gorulen kart islenmez, yeni kart item'a donusur."""
+        spider.scrape_stats = defaultdict(int)
+        spider.gorulmus_restoranlar = {"0x14cab8679fe2f5c5:0x1d6e3d1f8d9b5e2a"}
+        spider._calisma_restoranlari = set()
+        spider._checkpoint_yeni_restoranlar = []
+        yeni = self._kart(href=self.HREF.replace("0x1d6e3d1f8d9b5e2a", "0x1"), ad="Yeni Lokanta")
+        page = MagicMock(evaluate=AsyncMock(
+            return_value={"selektor": "a", "kartlar": [self._kart(), yeni]}
+        ))
+        islenen = []
+        asil = spider._tek_kart_isle
+
+        def kaydeden(kart, source_id):
+            islenen.append(source_id)
+            return asil(kart, source_id)
+
+        monkeypatch.setattr(spider, "_tek_kart_isle", kaydeden)
+
+        items, yeni_sayisi, kart_sayisi, calisma_yeni = asyncio.run(
+            spider._restoran_verilerini_cikar(page, None)
+        )
+        # Onceden yuklenmis kart da bu calismada ilk kez goruldu
+        assert (yeni_sayisi, kart_sayisi, calisma_yeni) == (1, 2, 2)
+        assert islenen == ["0x14cab8679fe2f5c5:0x1"]
+        assert items[0]["name"] == "Yeni Lokanta"
+        assert spider.scrape_stats["tekrar_eden_restoran"] == 1
+        assert spider.scrape_stats["benzersiz_restoran"] == 1
+
+    def test_gecersiz_href(self, spider):
+        """Place linki olmayan kart atlanir."""
+        assert spider._tek_kart_isle(self._kart(href="/maps/search/x")) is None
+
+
+class TestKoordinatCikar:
+    """Kart linkinden koordinat cikarma testleri."""
+
+    @pytest.mark.parametrize("url, beklenen", [
+        ("https://www.google.com/maps/place/X/data=!4m7!3m6!1s0x1:0x2!8m2!3d41.0431!4d29.0062",
+         (41.0431, 29.0062)),
+        ("https://www.google.com/maps/place/X/@41.01,28.97,17z/data=!3d40.0!4d30.0",
+         (41.01, 28.97)),
+        # Ilk @ koordinat degil; sonraki eslesme bulunur
+        ("https://www.google.com/maps/place/a@b/@41.02,28.98,15z", (41.02, 28.98)),
+        # Istanbul disi koordinat reddedilir
+        ("https://www.google.com/maps/place/X/data=!3d10.0!4d10.0", (None, None)),
+        ("https://www.google.com/maps/place/X", (None, None)),
+    ])
+    def test_koordinat(self, url, beklenen):
+        """@ ve !3d!4d bicimleri ilk gecerli eslesmeden okunur."""
+        assert GoogleMapsListSpider._koordinat_cikar(url) == beklenen
+
+
+class TestUrlDenIdCikar:
+    """Place ID'siz linklerden URL tabanli ID uretimi testleri."""
+
+    @pytest.mark.parametrize("url, beklenen", [
+        ("https://www.google.com/maps/place/Kad%C4%B1k%C3%B6y+Balik__Evi!/data=!4m2",
+         "url_Kadıköy_Balik_Evi"),
+        ("https://www.google.com/maps/place/__Cafe+%26+Bar__/", "url_Cafe_Bar"),
+        ("https://www.google.com/maps/place/Ev-Yemekleri/", "url_Ev-Yemekleri"),
+        ("https://www.google.com/maps/place/A+B/", ""),
+    ])
+    def test_ayiricilar_tek_alt_cizgiye_iner(self, url, beklenen):
+        """Ozel karakter ve alt cizgi dizileri tek '_' olur, uclar kirpilir."""
+        assert GoogleMapsListSpider._url_den_id_cikar(url) == beklenen
+
+
+class TestSayiParse:
+    """Yorum sayisi metni parse testleri."""
+
+    @pytest.mark.parametrize("metin, beklenen", [
+        ("1234", 1234),
+        ("(12.345)", 12345),
+        ("1,234", 1234),
+        ("1.234.567", 1234567),
+        ("4.5", 4),
+        ("1.234,5", 1234),
+        ("1,234.5", 1234),
+        ("1.2B", 1200),
+        ("1,2B", 1200),
+        ("12K", 12000),
+        ("", 0),
+        ("yok", 0),
+    ])
+    def test_sayi_formatlari(self, metin, beklenen):
+        """Turkce/Ingilizce ayiricilar ve bin kisaltmasi dogru yorumlanir."""
+        assert GoogleMapsListSpider._sayi_parse(metin) == beklenen
+
+
+class TestSayfaIsaretleri:
+    """CAPTCHA ve liste sonu isareti testleri."""
+
+    def test_captcha_isareti(self):
+        """Engelleme sayfasi isaretlerinden biri yeterlidir."""
+        assert _CAPTCHA_RE.search('<div class="g-recaptcha"></div>')
+        assert _CAPTCHA_RE.search("our systems have detected unusual traffic")
+        assert _CAPTCHA_RE.search("Our systems have detected Unusual Traffic")
+        assert not _CAPTCHA_RE.search("<div role=\"feed\"></div>")
+
+    def test_liste_sonu(self):
+        """Turkce mesajlar birebir, Ingilizceler harf duyarsiz eslesir."""
+        assert _LISTE_SONU_RE.search("...\nListenin sonuna ulaştınız.")
+        assert _LISTE_SONU_RE.search("You've reached the End of List.")
+        assert not _LISTE_SONU_RE.search("Daha fazla sonuç yükleniyor")
+
+    def test_scroll_liste_sonunda_durur(self, spider, monkeypatch):
+        """Her scroll tek evaluate ile yapilir; liste sonu mesajinda durulur."""
+        async def beklemesiz(_):
+            return None
+
+        monkeypatch.setattr(google_maps_list.asyncio, "sleep", beklemesiz)
+        spider.max_scroll = 60
+        spider._insan_benzeri_fare_hareketi = AsyncMock()
+        page = MagicMock(
+            query_selector=AsyncMock(return_value=object()),
+            evaluate=AsyncMock(side_effect=[
+                [1000, "Kart 1"],
+                [2000, "Kart 2"],
+                [3000, "Kart 3\nListenin sonuna ulaştınız."],
+            ]),
+        )
+        assert asyncio.run(spider._sonuc_paneli_scroll(page)) == 2
+        assert page.evaluate.await_count == 3
+
+    def test_scroll_paneli_once_feed_sorgulanir(self, spider):
+        """Feed varsa tek sorgu yeter; yoksa alternatif panele dusulur."""
+        spider.max_scroll = 1
+        feed_var = MagicMock(
+            query_selector=AsyncMock(return_value=object()),
+            evaluate=AsyncMock(return_value=[0, "Listenin sonuna ulaştınız."]),
+        )
+        asyncio.run(spider._sonuc_paneli_scroll(feed_var))
+        assert [c.args[0] for c in feed_var.query_selector.await_args_list] == [
+            'div[role="feed"]'
+        ]
+
+        feed_yok = MagicMock(
+            query_selector=AsyncMock(side_effect=[None, object()]),
+            evaluate=AsyncMock(return_value=[0, "Listenin sonuna ulaştınız."]),
+        )
+        asyncio.run(spider._sonuc_paneli_scroll(feed_yok))
+        assert [c.args[0] for c in feed_yok.query_selector.await_args_list] == [
+            'div[role="feed"]',
+            "div.m6QErb.DxyBCb",
+        ]
+        feed_yok.evaluate.assert_awaited_once()
+
+    def test_captcha_kontrol_html_indirmeden_karar_verir(self, spider):
+        """Sorry URL'i ve CAPTCHA iframe'i HTML okunmadan tespit edilir."""
+        sayac = MagicMock(count=AsyncMock(return_value=0))
+        page = MagicMock(
+            url="https://www.google.com/sorry/index?continue=maps",
+            locator=MagicMock(return_value=sayac),
+            evaluate=AsyncMock(return_value=""),
+        )
+        assert asyncio.run(spider._captcha_kontrol(page))
+        page.locator.assert_not_called()
+
+        page.url = "https://www.google.com/maps/search/restoran/@41.0,29.0,15z"
+        sayac.count.return_value = 1
+        assert asyncio.run(spider._captcha_kontrol(page))
+        page.evaluate.assert_not_awaited()
+
+        sayac.count.return_value = 0
+        assert not asyncio.run(spider._captcha_kontrol(page))
+        page.evaluate.assert_awaited_once()
+
+    def test_consent_butonu_kademe_basina_tek_sorgu(self, spider):
+        """Her consent kademesi tek locator sorgusuyla denenir."""
+        bos = MagicMock(count=AsyncMock(return_value=0))
+        buton = MagicMock(
+            count=AsyncMock(return_value=1),
+            bounding_box=AsyncMock(return_value=None),
+            click=AsyncMock(),
+        )
+        kademeler = google_maps_list._CONSENT_BUTON_KADEMELERI
+        page = MagicMock(
+            url="https://consent.google.com/m?continue=maps",
+            locator=MagicMock(side_effect=lambda sel: MagicMock(
+                first=buton if sel == kademeler[-1] else bos
+            )),
+            wait_for_url=AsyncMock(),
+        )
+        asyncio.run(spider._cookie_diyalogu_kapat(page))
+        assert [c.args[0] for c in page.locator.call_args_list] == list(kademeler)
+        buton.click.assert_awaited_once()
+
+    def test_yukleme_networkidle_beklemez(self, spider):
+        """Feed bulununca networkidle veya ek uyku beklenmeden donulur."""
+        page = MagicMock(
+            url="https://www.google.com/maps/search/restoran/@41.0,29.0,15z",
+            wait_for_selector=AsyncMock(),
+            wait_for_load_state=AsyncMock(),
+            locator=MagicMock(),
+        )
+        assert asyncio.run(spider._sayfa_yuklenmesini_bekle(page))
+        page.wait_for_load_state.assert_not_awaited()
+        page.locator.assert_not_called()
+
+
+class TestTokenKovasi:
+    """Grid hiz sinirlayici testleri."""
+
+    @pytest.fixture
+    def sahte_saat(self, monkeypatch):
+        """monotonic ve asyncio.sleep'i gercek bekleme yapmadan ilerletir."""
+        simdi = [0.0]
+        beklemeler = []
+
+        async def sahte_sleep(sure):
+            beklemeler.append(sure)
+            simdi[0] += sure
+
+        monkeypatch.setattr(google_maps_list._time, "monotonic", lambda: simdi[0])
+        monkeypatch.setattr(google_maps_list.asyncio, "sleep", sahte_sleep)
+        return simdi, beklemeler
+
+    def test_kapasite_kadar_beklemesiz(self, sahte_saat):
+        """Kapasite kadar token hemen alinir, sonrakiler hiza gore bekler."""
+        _, beklemeler = sahte_saat
+        kova = _TokenKovasi(hiz=0.5, kapasite=2)
+
+        async def al(n):
+            for _ in range(n):
+                await kova.al()
+
+        asyncio.run(al(2))
+        assert beklemeler == []
+        asyncio.run(al(2))
+        assert beklemeler == [pytest.approx(2.0), pytest.approx(2.0)]
+
+    def test_bos_sure_token_biriktirir(self, sahte_saat):
+        """Bosta gecen sure kapasiteyi asmadan token biriktirir."""
+        simdi, beklemeler = sahte_saat
+        kova = _TokenKovasi(hiz=1.0, kapasite=2)
+        asyncio.run(kova.al())
+        asyncio.run(kova.al())
+        simdi[0] += 100
+        for _ in range(2):
+            asyncio.run(kova.al())
+        assert beklemeler == []
+
+    def test_duraklatma_yeni_tokenleri_geciktirir(self, sahte_saat):
+        """Duraklatma suresince token verilmez ve token birikmez."""
+        _, beklemeler = sahte_saat
+        kova = _TokenKovasi(hiz=1.0, kapasite=3)
+        kova.duraklat(60)
+        asyncio.run(kova.al())
+        assert beklemeler == [pytest.approx(60.0), pytest.approx(1.0)]
+
+
+class TestGridHizMiddleware:
+    """Navigasyondan once hiz kovasi token'i alinmasi testleri."""
+
+    def test_yalnizca_grid_istekleri_token_bekler(self):
+        """Grid meta'li istek token alir, digerleri beklemeden gecer."""
+        mw = GridHizMiddleware()
+        spider = MagicMock(grid_hiz_tokeni_al=AsyncMock())
+        grid_istegi = scrapy.Request("https://x", meta={"_gm": _GridMeta(0, 41.0, 29.0, 15)})
+        asyncio.run(mw.process_request(scrapy.Request("https://y"), spider))
+        spider.grid_hiz_tokeni_al.assert_not_awaited()
+        asyncio.run(mw.process_request(grid_istegi, spider))
+        spider.grid_hiz_tokeni_al.assert_awaited_once()
+
+    def test_spider_token_ortak_kovadan_alinir(self, spider):
+        """Spider'in token metodu ortak grid hiz kovasini kullanir."""
+        spider._grid_kovasi = MagicMock(al=AsyncMock())
+        asyncio.run(spider.grid_hiz_tokeni_al())
+        spider._grid_kovasi.al.assert_awaited_once()
+
+    def test_ardisik_hata_sonrasi_grid_navigasyondan_once_bekler(self, spider, monkeypatch):
+        """Ardisik hata duraklatmasi yeni grid'i middleware'de, sayfa acilmadan tutar."""
+        simdi = [0.0]
+        beklemeler = []
+
+        async def sahte_sleep(sure):
+            beklemeler.append(sure)
+            simdi[0] += sure
+
+        monkeypatch.setattr(google_maps_list._time, "monotonic", lambda: simdi[0])
+        monkeypatch.setattr(google_maps_list.asyncio, "sleep", sahte_sleep)
+        spider.scrape_stats = defaultdict(int)
+        spider._geri_cekilme_seviyesi = 0
+        spider._grid_kovasi = _TokenKovasi(hiz=1.0, kapasite=5)
+        for _ in range(3):
+            spider._ardisik_hata_kontrolu("captcha")
+
+        istek = scrapy.Request("https://x", meta={"_gm": _GridMeta(0, 41.0, 29.0, 15)})
+        asyncio.run(GridHizMiddleware().process_request(istek, spider))
+        assert sum(beklemeler) >= spider.ARDISIK_HATA_BEKLEMELERI["captcha"]
+
+
+class TestArdisikHata:
+    """Ardisik hata sonrasi duraklatma testleri."""
+
+    def test_ardisik_hata_tipine_gore_ve_katlanarak_duraklatir(self, spider):
+        """Bekleme hata tipine gore secilir, tekrar tetiklenince ikiye katlanir."""
+        spider.scrape_stats = defaultdict(int)
+        spider._geri_cekilme_seviyesi = 0
+        spider._grid_kovasi = MagicMock()
+        for hata_tipi in ["captcha"] * 6 + ["TimeoutError"] * 3 + ["Bilinmeyen"] * 3:
+            spider._ardisik_hata_kontrolu(hata_tipi)
+        beklemeler = [c.args[0] for c in spider._grid_kovasi.duraklat.call_args_list]
+        assert beklemeler == [120, 240, 40, 240]
+
+        spider._geri_cekilme_seviyesi = 10
+        for _ in range(3):
+            spider._ardisik_hata_kontrolu("captcha")
+        spider._grid_kovasi.duraklat.assert_called_with(spider.ARDISIK_HATA_MAX_BEKLEME)